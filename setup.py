@@ -6,7 +6,8 @@ highly customisable. It operates much faster than most other tools due to it's
 use of key matching rather than recursively searching existing sequences for
 matches. It's speed should be roughly O(n).
 """
-from setuptools import setup, find_packages
+from setuptools import setup, find_packages, Extension
+from setuptools.command.build_ext import build_ext
 import os
 
 
@@ -17,6 +18,35 @@ with open(os.path.join(packagedir, 'ultrasequence', 'version.py'), 'r') as v:
 	exec(v.read(), globals())
 
 
+class OptionalBuildExt(build_ext):
+	"""
+	Builds the optional compiled speedups, but lets the install carry on
+	with the pure Python implementation if they fail to compile.
+	"""
+	def run(self):
+		try:
+			build_ext.run(self)
+		except Exception as e:
+			print('Skipping optional speedups: %s' % e)
+
+	def build_extension(self, ext):
+		try:
+			build_ext.build_extension(self, ext)
+		except Exception as e:
+			print('Skipping optional speedup %s: %s' % (ext.name, e))
+
+
+try:
+	from Cython.Build import cythonize
+except ImportError:
+	ext_modules = []
+else:
+	ext_modules = cythonize(
+		[Extension('ultrasequence._sequencer_fast',
+				   [os.path.join('ultrasequence', '_sequencer_fast.pyx')])],
+		quiet=True)
+
+
 setup(
 	packages=find_packages(),
 	name=NAME,
@@ -30,7 +60,9 @@ setup(
 	long_description=open('readme.rst').read(),
 	keywords='sequence file parser image ultra frames',
 	platforms=['MacOS 10.10', 'MacOS 10.11', 'MacOS 10.12', 'MacOS 10.13'],
-	python_requires='>=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*, <4',
+	python_requires='>=3.5, <4',
+	ext_modules=ext_modules,
+	cmdclass={'build_ext': OptionalBuildExt},
 	install_requires=[],
 	entry_points={
 		'console_scripts': [
@@ -0,0 +1,53 @@
+# cython: language_level=3
+"""
+SEQUENCER SPEEDUPS
+==================
+Optional compiled version of the per-file parsing in
+ultrasequence.models. It is only used with the default frame_extract
+config, everything else falls back to the pure Python implementation.
+"""
+
+
+def parse_name(unicode path, unicode prefix, unicode name):
+	"""
+	Compiled equivalent of ultrasequence.models._parse_name, which scans
+	for the frame digits one character at a time in C.
+
+	:param str path: The directory of the file.
+	:param str prefix: The directory joined with a trailing separator.
+	:param str name: The file basename.
+	:return: A tuple of (path, name, base, ext, namehead, framenum, head,
+			 tail).
+	"""
+	cdef Py_ssize_t dot, i, j
+	cdef Py_UCS4 char
+	cdef unicode base, ext, namehead, framenum, tail
+
+	dot = name.rfind(u'.')
+	if dot < 0:
+		base, ext = name, u''
+	else:
+		base, ext = name[:dot], name[dot + 1:]
+
+	i = len(base)
+	while i > 0:
+		char = base[i - 1]
+		if char.isdecimal():
+			break
+		i -= 1
+	if i == 0:
+		namehead, framenum, tail = base, u'', u''
+	else:
+		j = i - 1
+		while j > 0:
+			char = base[j - 1]
+			if not char.isdecimal():
+				break
+			j -= 1
+		namehead, framenum, tail = base[:j], base[j:i], base[i:]
+
+	if not ext:
+		tail = u''
+	else:
+		tail = tail + u'.' + ext
+	return path, name, base, ext, namehead, framenum, prefix + namehead, tail
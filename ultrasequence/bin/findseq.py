@@ -102,6 +102,12 @@ def get_args():
 						help=''
 						)
 
+	parser.add_argument('-w', '--stat-workers',
+						type=int,
+						help='number of threads used to get file stats. '
+							 'Speeds up --get-stats on network filesystems.'
+						)
+
 	parser.add_argument('-p', '--strict-padding',
 						action='store_true',
 						help='disables the ignore_padding rule. This will '
@@ -128,6 +134,8 @@ def main():
 		cfg.recurse = True
 	if args.strict_padding:
 		cfg.ignore_padding = False
+	if args.stat_workers:
+		cfg.stat_workers = args.stat_workers
 
 	parser = Parser(include_exts=cfg.include_exts,
 	                exclude_exts=cfg.exclude_exts,
@@ -135,7 +143,8 @@ def main():
 	                ignore_padding=cfg.ignore_padding)
 
 	if os.path.isdir(args.source):
-		parser.parse_directory(args.source, recurse=cfg.recurse)
+		parser.parse_directory(args.source, recurse=cfg.recurse,
+							   stat_workers=cfg.stat_workers)
 	elif os.path.isfile(os.path.expanduser(args.source)):
 		parser.parse_file(args.source)
 
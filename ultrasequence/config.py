@@ -11,13 +11,8 @@ GLOBALS
 CONFIG
 
 """
+import configparser
 import logging
-try:
-	import configparser
-	PYTHON_VERSION = 3
-except ImportError:
-	import ConfigParser as configparser
-	PYTHON_VERSION = 2
 import os
 
 logger = logging.getLogger()
@@ -44,6 +39,7 @@ class UsConfig(object):
 				'include_exts': '',
 				'exclude_exts': '',
 				'get_stats': 'false',
+				'stat_workers': '0',
 			},
 			'regex': {
 				'frame_extract': r'((.*)(\D))?(\d+)(.*)',
@@ -55,27 +51,19 @@ class UsConfig(object):
 		self.user_config_file = os.path.expanduser('~/.ultrasequence.conf')
 		self.default_parser = configparser.RawConfigParser()
 
-		if PYTHON_VERSION == 3:
-			self.default_parser.read_dict(self.default_config)
-		else:
-			self.default_parser.add_section('global')
-			for key in self.default_config['global'].keys():
-				self.default_parser.set(
-					'global', key, self.default_config['global'][key])
-			self.default_parser.add_section('regex')
-			for key in self.default_config['regex'].keys():
-				self.default_parser.set(
-					'regex', key, self.default_config['regex'][key])
+		self.default_parser.read_dict(self.default_config)
 
 		self._load_config(self.default_parser)
 		self._load_user_config()
 
 	def __repr__(self):
 		return (
-			'Config({recurse={0}, ignore_padding={1}, include_exts={2},'
-			'exclude_exts={3}, get_stats={4}, format={5})'.format(
+			'Config(recurse={0}, ignore_padding={1}, include_exts={2}, '
+			'exclude_exts={3}, get_stats={4}, stat_workers={5}, '
+			'format={6})'.format(
 				self.recurse, self.ignore_padding, self.include_exts,
-				self.exclude_exts, self.get_stats, self.format))
+				self.exclude_exts, self.get_stats, self.stat_workers,
+				self.format))
 
 	def _load_config(self, cfgparser):
 		"""
@@ -89,6 +77,11 @@ class UsConfig(object):
 		self.include_exts = cfgparser.get('global', 'include_exts').split()
 		self.exclude_exts = cfgparser.get('global', 'exclude_exts').split()
 		self.get_stats = cfgparser.getboolean('global', 'get_stats')
+		# Not present in config files written by older versions.
+		if cfgparser.has_option('global', 'stat_workers'):
+			self.stat_workers = cfgparser.getint('global', 'stat_workers')
+		else:
+			self.stat_workers = 0
 		self.frame_extract_re = cfgparser.get('regex', 'frame_extract')
 		self.head_group = cfgparser.getint('regex', 'head_group')
 		self.frame_group = cfgparser.getint('regex', 'frame_group')
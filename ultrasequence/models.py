@@ -6,18 +6,72 @@ Contains the core data structure models for sequencing files.
 
 import logging
 import os
+from itertools import islice
 import re
+from sys import intern
 from .config import CONFIG as cfg
 
 try:
-	FileNotFoundError
-except NameError:
-	FileNotFoundError = OSError
+	import numpy
+except ImportError:
+	numpy = None
+
+try:
+	from ultrasequence._sequencer_fast import parse_name as _fast_parse_name
+except ImportError:  # the optional compiled speedups are not built
+	_fast_parse_name = None
 
 
 logger = logging.getLogger(__name__)
 
 
+# The frame_extract config regex and group indices the right-to-left
+# scans in _scan_frame and _sequencer_fast are equivalent to.
+_DEFAULT_FRAME_EXTRACT = (
+	cfg.default_config['regex']['frame_extract'],
+	cfg.default_config['regex']['head_group'],
+	cfg.default_config['regex']['frame_group'],
+	cfg.default_config['regex']['tail_group'],
+)
+
+
+def _default_frame_extract():
+	""" True if the frame_extract config is the default one. """
+	return (cfg.frame_extract_re, cfg.head_group, cfg.frame_group,
+			cfg.tail_group) == _DEFAULT_FRAME_EXTRACT
+
+
+def _scan_frame(name):
+	"""
+	Split name around its last set of digits by scanning from the end
+	of the string. Returns the same parts as the default frame_extract
+	regex, without the cost of the regex engine backtracking.
+	"""
+	i = len(name)
+	while i and not name[i - 1].isdecimal():
+		i -= 1
+	if not i:
+		return name, '', ''
+	j = i - 1
+	while j and name[j - 1].isdecimal():
+		j -= 1
+	return name[:j], name[j:i], name[i:]
+
+
+def _match_frame(name):
+	""" Split name with the frame_extract config regex. """
+	frame_match = re.match(cfg.frame_extract_re, name)
+	if frame_match:
+		groups = frame_match.groups()
+		head, tail = groups[cfg.head_group], groups[cfg.tail_group]
+		frame = groups[cfg.frame_group]
+	else:
+		head, frame, tail = (name, '', '')
+	if head is None:
+		head = ''
+	return head, frame, tail
+
+
 def extract_frame(name):
 	"""
 	This function by default extracts the last set of digits in the
@@ -32,16 +86,9 @@ def extract_frame(name):
 	         (last set of digits), and tail (all digits succeeding
 	         the frame number).
 	"""
-	frame_match = re.match(cfg.frame_extract_re, name)
-	if frame_match:
-		groups = frame_match.groups()
-		head, tail = groups[cfg.head_group], groups[cfg.tail_group]
-		frame = groups[cfg.frame_group]
-	else:
-		head, frame, tail = (name, '', '')
-	if head is None:
-		head = ''
-	return head, frame, tail
+	if _default_frame_extract():
+		return _scan_frame(name)
+	return _match_frame(name)
 
 
 def split_extension(filename):
@@ -53,14 +100,59 @@ def split_extension(filename):
 	:return: A tuple of the head (characters before the last '.') and
 			 the extension (characters after the last '.').
 	"""
-	parts = filename.split('.')
-	if len(parts) < 2:
-		return parts[0], ''
-	ext = parts.pop(-1)
-	head = '.'.join(parts)
+	head, sep, ext = filename.rpartition('.')
+	if not sep:
+		return filename, ''
 	return head, ext
 
 
+# Matches a format directive and captures its character.
+_DIRECTIVE_RE = re.compile(r'%(.?)', re.DOTALL)
+
+# Frame lists shorter than this are faster to range in pure Python, as
+# converting the list to an array costs more than the loop it replaces.
+_NUMPY_MIN_FRAMES = 4096
+
+
+def _frame_runs(frames):
+	"""
+	Run-length encode sorted frame numbers into the first and last frame
+	of each consecutive run. Large lists are encoded with numpy if it is
+	available, which finds all the run breaks without a Python-level
+	branch per frame.
+
+	:param list frames: Sorted, non-empty list of frame numbers.
+	:return: A tuple of two lists, the start and end frame of each run.
+	"""
+	if numpy is not None and len(frames) >= _NUMPY_MIN_FRAMES:
+		try:
+			frame_array = numpy.fromiter(frames, dtype=numpy.int64,
+										 count=len(frames))
+		except OverflowError:  # frame numbers too large for int64
+			pass
+		else:
+			breaks = numpy.flatnonzero(numpy.diff(frame_array) != 1)
+			return (frame_array[numpy.r_[0, breaks + 1]].tolist(),
+					frame_array[numpy.r_[breaks, -1]].tolist())
+	starts = [frames[0]]
+	ends = []
+	previous = frames[0]
+	for x in islice(frames, 1, None):
+		if x - 1 != previous:
+			ends.append(previous)
+			starts.append(x)
+		previous = x
+	ends.append(previous)
+	return starts, ends
+
+
+def _runs_to_string(starts, ends):
+	""" Format the runs returned by _frame_runs as a range string. """
+	range_strings = ['%d-%d' % (start, end) if end != start else str(start)
+					 for start, end in zip(starts, ends)]
+	return '[' + ', '.join(range_strings) + ']'
+
+
 def frame_ranges_to_string(frames):
 	"""
 	Take a list of numbers and make a string representation of the ranges.
@@ -68,32 +160,88 @@ def frame_ranges_to_string(frames):
 	>>> frame_ranges_to_string([1, 2, 3, 6, 7, 8, 9, 13, 15])
 	'[1-3, 6-9, 13, 15]'
 
-	:param list frames: Sorted list of frame numbers.
+	:param list frames: List of frame numbers.
 	:return: String of broken frame ranges (i.e '[10-14, 16, 20-25]').
 	"""
 	if not frames:
 		return '[]'
-	if not isinstance(frames, list):
-		frames = list(frames)
-	frames.sort()
-
-	# Make list of lists for each consecutive range
-	ranges = [[frames.pop(0)]]
-	current_range_index = 0  # index of current range
-	for x in frames:
-		if x - 1 == ranges[current_range_index][-1]:
-			ranges[current_range_index].append(x)
-		else:
-			current_range_index += 1
-			ranges.append([x])
-	range_strings = []
-	for x in ranges:
-		if len(x) > 1:
-			range_strings.append('-'.join([str(x[0]), str(x[-1])]))
-		else:
-			range_strings.append(str(x[0]))
-	complete_string = '[' + ', '.join(range_strings) + ']'
-	return complete_string
+	return _runs_to_string(*_frame_runs(sorted(frames)))
+
+
+def _parse_name(path, prefix, name, default_extract):
+	"""
+	Split a basename into all the string parts a File is made of.
+
+	:param str path: The directory of the file.
+	:param str prefix: The directory joined with a trailing separator.
+	:param str name: The file basename.
+	:param bool default_extract: The result of _default_frame_extract,
+	                             so callers can check it once per batch.
+	:return: A tuple of (path, name, base, ext, namehead, framenum, head,
+			 tail).
+	"""
+	if default_extract:
+		if _fast_parse_name is not None:
+			return _fast_parse_name(path, prefix, name)
+		base, ext = split_extension(name)
+		namehead, framenum, tail = _scan_frame(base)
+	else:
+		base, ext = split_extension(name)
+		namehead, framenum, tail = _match_frame(base)
+	if not ext:
+		tail = ''
+	else:
+		tail = '.'.join([tail, ext])
+	return path, name, base, ext, namehead, framenum, prefix + namehead, tail
+
+
+def _parse_path(filepath):
+	"""
+	Split a filepath into all the string parts a File is made of. Used
+	by File and by the Parser's soa mode, which stores rows instead of
+	File objects.
+
+	:param str filepath: The filepath to split.
+	:return: A tuple of (path, name, base, ext, namehead, framenum, head,
+			 tail).
+	"""
+	path, name = os.path.split(filepath)
+	return _parse_name(path, os.path.join(path, ''), name,
+					   _default_frame_extract())
+
+
+def _parse_names(path, names):
+	"""
+	Batch version of _parse_path for files sharing the same directory,
+	which only splits and joins the directory once.
+
+	:param str path: The directory of the files.
+	:param list names: The file basenames.
+	:return: A list of _parse_path tuples in the order of names.
+	"""
+	prefix = os.path.join(path, '')
+	default_extract = _default_frame_extract()
+	return [_parse_name(path, prefix, name, default_extract)
+			for name in names]
+
+
+def _seq_key(head, framenum, tail, ignore_padding):
+	""" Sequence key from File parts, see File.get_seq_key. """
+	if not framenum:
+		return head + tail
+	elif ignore_padding:
+		return head + '#' + tail
+	return head + '%%0%dd' % len(framenum) + tail
+
+
+def _stat_value(value, type_):
+	""" Convert a Stat value with type_, or None if it can't be. """
+	if value is None:
+		return None
+	try:
+		return type_(value)
+	except (TypeError, ValueError):
+		return None
 
 
 class Stat(object):
@@ -104,11 +252,16 @@ class Stat(object):
 	directory which the current machine does not have access to.
 	"""
 
+	__slots__ = ('st_size', 'st_ino', 'st_nlink', 'st_dev', 'st_mode',
+				 'st_uid', 'st_gid', 'st_ctime', 'st_mtime', 'st_atime')
+
 	def __init__(self, size=None, ino=None, ctime=None, mtime=None,
 				 atime=None, mode=None, dev=None, nlink=None, uid=None,
 				 gid=None):
 		"""
 		Refer to the docs for the the built-in os.stat module for more info.
+		Values are converted to int or float on init, values that can't
+		be converted are stored as None.
 		
 		:param int size: File size in bytes.
 		:param int ino: Inode number.
@@ -121,28 +274,23 @@ class Stat(object):
 		:param int uid: User id of the owner.
 		:param int gid: Group id of the owner.
 		"""
-		self.st_size = size
-		self.st_ino = ino
-		self.st_nlink = nlink
-		self.st_dev = dev
-		self.st_mode = mode
-		self.st_uid = uid
-		self.st_gid = gid
-		self.st_ctime = ctime
-		self.st_mtime = mtime
-		self.st_atime = atime
-
-	def __getattr__(self, item):
-		ints = ['st_size', 'st_ino', 'st_nlink', 'st_dev', 'st_mode',
-				'st_uid', 'st_gid']
-		floats = ['st_ctime', 'st_mtime', 'st_atime']
-		try:
-			if item in ints:
-				return int(super(Stat, self).__getattribute__(item))
-			elif item in floats:
-				return float(super(Stat, self).__getattribute__(item))
-		except TypeError:
-			return None
+		self.st_size = _stat_value(size, int)
+		self.st_ino = _stat_value(ino, int)
+		self.st_nlink = _stat_value(nlink, int)
+		self.st_dev = _stat_value(dev, int)
+		self.st_mode = _stat_value(mode, int)
+		self.st_uid = _stat_value(uid, int)
+		self.st_gid = _stat_value(gid, int)
+		self.st_ctime = _stat_value(ctime, float)
+		self.st_mtime = _stat_value(mtime, float)
+		self.st_atime = _stat_value(atime, float)
+
+	def __getstate__(self):
+		return {slot: getattr(self, slot) for slot in self.__slots__}
+
+	def __setstate__(self, state):
+		for slot, value in state.items():
+			setattr(self, slot, value)
 
 
 class File(object):
@@ -153,34 +301,51 @@ class File(object):
 	and extension. All Sequences are comprised of File objects.
 	"""
 
-	def __init__(self, filepath, stats=None, get_stats=None):
+	__slots__ = ('abspath', 'path', 'name', '_base', 'ext', 'namehead',
+				 '_framenum', '_frame', 'head', 'tail', 'padding', '_stat',
+				 '_entry', '_seq_key_ignore', '_seq_key_pad')
+
+	def __init__(self, filepath, stats=None, get_stats=None, parts=None):
 		"""
 		Initalize a single File instance.
 
 		:param str filepath: the absolute filepath of the file
-		:param stats: dict or iterable to map Stat class or 
-		              os.stat_result object.
+		:param stats: dict or iterable to map Stat class, 
+		              os.stat_result object, or os.DirEntry to get
+		              the stats from when they are first accessed.
 		:param bool get_stats: True to attempt to call os.stat on
 		                       the file. If file does not exist,
 		                       revert back to applying stats values
 		                       if they were supplied, else set stats
 		                       to None.
+		:param tuple parts: The _parse_path parts of filepath if they
+		                    were already parsed, see _parse_names.
 		"""
 		if get_stats is not None and isinstance(get_stats, bool):
 			cfg.get_stats = get_stats
 		self.abspath = filepath
-		self.path, self.name = os.path.split(filepath)
-		self._base, self.ext = split_extension(self.name)
-
-		parts = extract_frame(self._base)
-		self.namehead, self._framenum, tail = parts
-		self.head = os.path.join(self.path, self.namehead)
-		if not self.ext:
-			self.tail = ''
-		else:
-			self.tail = '.'.join([tail, self.ext])
+		if parts is None:
+			parts = _parse_path(filepath)
+		(path, self.name, self._base, ext, namehead, self._framenum, head,
+		 tail) = parts
+		# All frames of a sequence share these strings, so intern them
+		# to keep a single copy in memory and speed up key lookups.
+		self.path = intern(path)
+		self.ext = intern(ext)
+		self.namehead = intern(namehead)
+		self.head = intern(head)
+		self.tail = intern(tail)
 		self.padding = len(self._framenum)
+		try:
+			self._frame = int(self._framenum)
+		except ValueError:
+			self._frame = None
+		self._seq_key_ignore = intern(
+			_seq_key(self.head, self._framenum, self.tail, True))
+		# Only needed with strict padding, see get_seq_key.
+		self._seq_key_pad = None
 
+		self._entry = None
 		try:
 			if get_stats:
 				try:
@@ -189,15 +354,18 @@ class File(object):
 					if stats is None:
 						raise TypeError
 			if isinstance(stats, os.stat_result):
-				self.stat = stats
+				self._stat = stats
 			elif isinstance(stats, dict):
-				self.stat = Stat(**stats)
+				self._stat = Stat(**stats)
 			elif isinstance(stats, (list, tuple)):
-				self.stat = Stat(*stats)
+				self._stat = Stat(*stats)
+			elif callable(getattr(stats, 'stat', None)):  # os.DirEntry
+				self._stat = None
+				self._entry = stats
 			else:
 				raise TypeError
 		except TypeError:
-			self.stat = Stat()
+			self._stat = Stat()
 
 	def __str__(self):
 		return self.abspath
@@ -205,53 +373,79 @@ class File(object):
 	def __repr__(self):
 		return "File('%s')" % self.abspath
 
+	def __getstate__(self):
+		# os.DirEntry can't be pickled, so fetch the stats it holds first.
+		state = {slot: getattr(self, slot) for slot in self.__slots__}
+		state['_stat'] = self.stat
+		state['_entry'] = None
+		return state
+
+	def __setstate__(self, state):
+		for slot, value in state.items():
+			setattr(self, slot, value)
+
 	def __lt__(self, other):
 		if isinstance(other, File):
-			return self.frame < other.frame
+			return self._frame < other._frame
 		else:
 			raise TypeError('%s not File instance.' % str(other))
 
 	def __gt__(self, other):
 		if isinstance(other, File):
-			return self.frame > other.frame
+			return self._frame > other._frame
 		else:
 			raise TypeError('%s not File instance.' % str(other))
 
 	def __le__(self, other):
 		if isinstance(other, File):
-			return self.frame <= other.frame
+			return self._frame <= other._frame
 		else:
 			raise TypeError('%s not File instance.' % str(other))
 
 	def __ge__(self, other):
 		if isinstance(other, File):
-			return self.frame >= other.frame
+			return self._frame >= other._frame
 		else:
 			raise TypeError('%s not File instance.' % str(other))
 
 	def __eq__(self, other):
 		if isinstance(other, File):
-			return (self.head, self.frame, self.tail) == (other.head,
-														  other.frame,
-														  other.tail)
+			return (self._frame == other._frame and self.head == other.head
+					and self.tail == other.tail)
 		else:
 			return False
 
 	def __ne__(self, other):
 		if isinstance(other, File):
-			return (self.head, self.frame, self.tail) != (other.head,
-														  other.frame,
-														  other.tail)
+			return (self._frame != other._frame or self.head != other.head
+					or self.tail != other.tail)
 		else:
 			return True
 
+	@property
+	def stat(self):
+		"""
+		The os.stat_result or Stat of the file. If the File was given an
+		os.DirEntry, its stats are only fetched the first time this is
+		accessed.
+		"""
+		if self._entry is not None:
+			try:
+				self._stat = self._entry.stat(follow_symlinks=False)
+			except OSError:
+				self._stat = Stat()
+			self._entry = None
+		return self._stat
+
+	@stat.setter
+	def stat(self, stats):
+		self._stat = stats
+		self._entry = None
+
 	@property
 	def frame(self):
 		""" Integer frame number. """
-		try:
-			return int(self._framenum)
-		except ValueError:
-			return None
+		return self._frame
 
 	@property
 	def frame_as_str(self):
@@ -388,22 +582,54 @@ class File(object):
 		"""
 		if ignore_padding is None or not isinstance(ignore_padding, bool):
 			ignore_padding = cfg.ignore_padding
-		if not self._framenum:
-			digits = ''
-		elif ignore_padding is True:
-			digits = '#'
+		if ignore_padding is True:
+			return self._seq_key_ignore
 		elif ignore_padding is False:
-			digits = '%%0%dd' % self.padding
+			if self._seq_key_pad is None:
+				self._seq_key_pad = intern(
+					_seq_key(self.head, self._framenum, self.tail, False))
+			return self._seq_key_pad
 		else:
 			raise TypeError('ignore_padding argument must be of type bool.')
-		return self.head + digits + self.tail
+
+
+class _RowFrames(dict):
+	"""
+	Frame dictionary for Sequences built by a Parser in soa mode. Values
+	are row indices into the Parser's columns until they are first read,
+	at which point the row is swapped for its File object.
+	"""
+
+	__slots__ = ('_get_file',)
+
+	def __init__(self, get_file, frames=()):
+		"""
+		:param get_file: Callable returning the File for a row index.
+		:param frames: Existing frame to File mapping to start from.
+		"""
+		super(_RowFrames, self).__init__(frames)
+		self._get_file = get_file
+
+	def __getitem__(self, frame):
+		file_ = dict.__getitem__(self, frame)
+		if not isinstance(file_, File):
+			file_ = self._get_file(file_)
+			dict.__setitem__(self, frame, file_)
+		return file_
+
+	def __reduce__(self):
+		# The row getter is bound to the Parser's columns, so build all
+		# the Files and pickle or copy them as a plain dict.
+		return dict, ({frame: self[frame] for frame in self},)
 
 
 class Sequence(object):
 	"""
 	Class representing a sequence of matching file names. The frames
 	are stored in a dictionary with the frame numbers as keys. Sets
-	are used for fast operations in calculating missing frames.
+	are used for fast operations in calculating missing frames. A list
+	of the frame numbers is kept alongside the dictionary, and is only
+	sorted when it is read after frames were added out of order.
 
 	This class's usage of dictionaries and sets is the core of the
 	speed of this program. Rather than recursively searching existing
@@ -424,6 +650,8 @@ class Sequence(object):
 		if ignore_padding is not None and isinstance(ignore_padding, bool):
 			cfg.ignore_padding = ignore_padding
 		self._frames = {}
+		self._frame_list = []
+		self._frame_list_sorted = True
 		self.seq_name = ''
 		self.path = ''
 		self.namehead = ''
@@ -432,15 +660,19 @@ class Sequence(object):
 		self.ext = ''
 		self.padding = 0
 		self.inconsistent_padding = False
+		self._str_cache = None
 		if frame_file is not None:
 			self.append(frame_file)
 
 	def __str__(self):
-		return self.format(cfg.format)
+		# Sequences are usually printed repeatedly with the same format,
+		# so keep the last result until the format or the frames change.
+		if self._str_cache is None or self._str_cache[0] != cfg.format:
+			self._str_cache = (cfg.format, self.format(cfg.format))
+		return self._str_cache[1]
 
 	def __repr__(self):
-		return "Sequence('%s', frames=%d)" % (
-			self.format(cfg.format), self.frames)
+		return "Sequence('%s', frames=%d)" % (str(self), self.frames)
 
 	def __len__(self):
 		return len(self._frames)
@@ -449,10 +681,9 @@ class Sequence(object):
 		return iter([self._frames[frame] for frame in self._frames])
 
 	def __getitem__(self, frames):
-		all_frames = list(sorted(self._frames))
 		if isinstance(frames, slice):
-			return [self._frames[f] for f in sorted(self._frames)][frames]
-		return self._frames[all_frames[frames]]
+			return [self._frames[f] for f in self._sorted_frames[frames]]
+		return self._frames[self._sorted_frames[frames]]
 
 	def __lt__(self, other):
 		if isinstance(other, str):
@@ -473,12 +704,12 @@ class Sequence(object):
 	@property
 	def start(self):
 		""" Int of first frame in sequence. """
-		return min(self._frames)
+		return self._sorted_frames[0]
 
 	@property
 	def end(self):
 		""" Int of last frame in sequence. """
-		return max(self._frames)
+		return self._sorted_frames[-1]
 
 	@property
 	def frames(self):
@@ -488,7 +719,7 @@ class Sequence(object):
 	@property
 	def frame_numbers(self):
 		""" List of frame ints in sequence. """
-		return list(sorted(self._frames))
+		return list(self._sorted_frames)
 
 	@property
 	def frame_range(self):
@@ -585,6 +816,69 @@ class Sequence(object):
 			self.inconsistent_padding = True
 			self.padding = frame_file.padding
 		self._frames[frame_file.frame] = frame_file
+		self._add_frame_number(frame_file.frame)
+		self._str_cache = None
+
+	def _append_fast(self, frame_file):
+		"""
+		Add a File already known to share this sequence's key, skipping
+		the type and sequence key checks done by append. The Sequence
+		must already contain a frame added with append.
+
+		:param File frame_file: File instance to append to Sequence.
+		"""
+		frame = frame_file.frame
+		if frame in self._frames:
+			raise IndexError(
+				'%s already in sequence as %s' % (
+					frame_file.name, self._frames[frame]))
+		elif self.padding < frame_file.padding:
+			self.inconsistent_padding = True
+			self.padding = frame_file.padding
+		self._frames[frame] = frame_file
+		self._add_frame_number(frame)
+		self._str_cache = None
+
+	def _append_row(self, frame, padding, row, get_file):
+		"""
+		Add a frame from a Parser row without building its File object.
+		The Sequence must already contain a frame added with append.
+
+		:param int frame: Frame number of the row.
+		:param int padding: Number of digits in the row's frame number.
+		:param int row: Row index in the Parser columns.
+		:param get_file: Callable returning the File for a row index.
+		"""
+		if not isinstance(self._frames, _RowFrames):
+			self._frames = _RowFrames(get_file, self._frames)
+		if frame in self._frames:
+			raise IndexError(
+				'%s already in sequence as %s' % (
+					get_file(row).name, self._frames[frame]))
+		elif self.padding < padding:
+			self.inconsistent_padding = True
+			self.padding = padding
+		self._frames[frame] = row
+		self._add_frame_number(frame)
+		self._str_cache = None
+
+	def _add_frame_number(self, frame):
+		""" Add a new frame number to the frame list. """
+		if self._frame_list and frame < self._frame_list[-1]:
+			self._frame_list_sorted = False
+		self._frame_list.append(frame)
+
+	@property
+	def _sorted_frames(self):
+		"""
+		The sorted frame list. Directory listings are not in frame order,
+		so the list is sorted once when it is read instead of inserting
+		every frame in place.
+		"""
+		if not self._frame_list_sorted:
+			self._frame_list.sort()
+			self._frame_list_sorted = True
+		return self._frame_list
 
 	def format(self, str_format=cfg.format):
 		"""
@@ -634,44 +928,43 @@ class Sequence(object):
 		:param str_format: The string directive for the formatter to convert.
 		:return: The formatted sequence string.
 		"""
+		program = self._compile_format(str_format)
+		return ''.join([literal if directive is None else directive(self)
+						for literal, directive in program])
 
-		# Call functions to minimize processes run during formatter execution.
-		directive_mapper = {
-			'%%': self.__pct,
-			'%p': self.__path,
-			'%h': self.__namehead,
-			'%H': self.__head,
-			'%f': self.__num_frames,
-			'%r': self.__implied_range,
-			'%R': self.__explicit_range,
-			'%m': self.__num_missing_frames,
-			'%M': self.__explicit_missing_range,
-			'%D': self.__digits_pound_signs,
-			'%P': self.__digits_padding,
-			'%t': self.__tail_without_ext,
-			'%T': self.__tail,
-			'%e': self.__ext,
-			}
-		str_format = [c for c in str_format]
-		new_string = ''
-
-		matched = False
-		for char in str_format:
-			if matched:
-				new_string += directive_mapper['%' + char]()
-				matched = False
-				continue
-			if char == '%':
-				matched = True
-				continue
-			else:
-				new_string += char
-		return new_string
+	@classmethod
+	def _compile_format(cls, str_format):
+		"""
+		Compile a format string into a tuple of (literal, None) and
+		(None, directive method) pairs, so the string is only parsed
+		once no matter how many sequences are formatted with it.
 
-	@staticmethod
-	def __pct():
-		""" Internal formatter method """
-		return '%'
+		:param str str_format: The format string to compile.
+		:return: The compiled format program.
+		"""
+		program = cls._format_programs.get(str_format)
+		if program is not None:
+			return program
+		program = []
+		literal = ''
+		# split alternates literal text and the character of a directive.
+		parts = _DIRECTIVE_RE.split(str_format)
+		for i, part in enumerate(parts):
+			if not i % 2 or part == '%':
+				literal += part
+			elif part:  # a trailing lone '%' is dropped
+				directive = cls._directives['%' + part]
+				if literal:
+					program.append((literal, None))
+					literal = ''
+				program.append((None, directive))
+		if literal:
+			program.append((literal, None))
+		program = tuple(program)
+		if len(cls._format_programs) >= 128:
+			cls._format_programs.clear()
+		cls._format_programs[str_format] = program
+		return program
 
 	def __path(self):
 		""" Internal formatter method """
@@ -696,7 +989,7 @@ class Sequence(object):
 
 	def __explicit_range(self):
 		""" Internal formatter method """
-		return frame_ranges_to_string(sorted(self._frames))
+		return _runs_to_string(*_frame_runs(self._sorted_frames))
 
 	def __num_missing_frames(self):
 		""" Internal formatter method """
@@ -704,7 +997,11 @@ class Sequence(object):
 
 	def __explicit_missing_range(self):
 		""" Internal formatter method """
-		return frame_ranges_to_string(self.get_missing_frames())
+		# The missing ranges are the gaps between the runs of frames, which
+		# avoids listing every missing frame of sparse sequences.
+		starts, ends = _frame_runs(self._sorted_frames)
+		return _runs_to_string([end + 1 for end in ends[:-1]],
+							   [start - 1 for start in starts[1:]])
 
 	def __digits_pound_signs(self):
 		""" Internal formatter method """
@@ -725,3 +1022,24 @@ class Sequence(object):
 	def __ext(self):
 		""" Internal formatter method """
 		return self.ext
+
+	# Format directives mapped to their internal formatter methods. '%%'
+	# is handled as a literal by _compile_format.
+	_directives = {
+		'%p': __path,
+		'%h': __namehead,
+		'%H': __head,
+		'%f': __num_frames,
+		'%r': __implied_range,
+		'%R': __explicit_range,
+		'%m': __num_missing_frames,
+		'%M': __explicit_missing_range,
+		'%D': __digits_pound_signs,
+		'%P': __digits_padding,
+		'%t': __tail_without_ext,
+		'%T': __tail,
+		'%e': __ext,
+	}
+
+	# Cache of compiled format programs, see _compile_format.
+	_format_programs = {}
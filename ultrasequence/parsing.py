@@ -6,40 +6,110 @@ for file sequences.
 """
 import logging
 import os
-import sys
-from os import walk
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from os import scandir
 from ultrasequence.config import CONFIG as cfg
-from ultrasequence.models import File, Sequence
+from ultrasequence.models import (
+	File, Sequence, Stat, _parse_path, _parse_names, _seq_key)
 
 
 logger = logging.getLogger(__name__)
 
 
-if sys.version_info < (3, 5):
+def _scan_dirs(path, recurse):
+	"""
+	Generator yielding a (directory, entries) tuple for every directory
+	scanned, where entries is a list of the DirEntry objects for the
+	regular files in that directory. Symlinks are skipped. Directories
+	are walked breadth first from a queue rather than by recursion, so
+	deep trees don't stack up generator frames. Directories that can't
+	be listed are logged and skipped, like os.walk does.
+
+	:param str path: The directory to scan.
+	:param bool recurse: Descend into child directories.
+	"""
+	dirs = deque([path])
+	while dirs:
+		dir_ = dirs.popleft()
+		files = []
+		sub_dirs = []
+		try:
+			for entry in scandir(dir_):
+				if entry.is_symlink():
+					continue
+				if entry.is_dir(follow_symlinks=False):
+					if recurse:
+						sub_dirs.append(entry.path)
+				elif entry.is_file(follow_symlinks=False):
+					files.append(entry)
+		except OSError as err:
+			logger.warning('Skipping %s, it could not be listed: %s'
+						   % (dir_, err))
+			continue
+		dirs.extend(sub_dirs)
+		yield dir_, files
+
+
+def _prefetch_stat(entry):
+	"""
+	Stat a DirEntry so the result is cached on it. Errors are left for
+	the caller to hit when it reads the stats.
+	"""
+	try:
+		entry.stat(follow_symlinks=False)
+	except OSError:
+		pass
+
+
+def _scan_dir_entries(path, filter_entries=None):
+	"""
+	Like _scan_dirs, using the cfg.recurse setting. If cfg.get_stats is
+	True and cfg.stat_workers is above 1, the stats of each directory's
+	entries are fetched from a thread pool before it is yielded, which
+	overlaps the round trips to network filesystems. DirEntry caches the
+	stats, so reading them afterwards costs no extra system call.
+
+	:param str path: The directory to scan.
+	:param filter_entries: Callable taking a directory's list of entries
+	                       and returning the ones to keep. It is applied
+	                       before any stats are fetched.
+	"""
+	executor = None
+	if cfg.get_stats and cfg.stat_workers > 1:
+		executor = ThreadPoolExecutor(max_workers=cfg.stat_workers)
 	try:
-		from scandir import walk
-	except ImportError:
-		logger.warning('For Python versions < 3.5, scandir module is '
-		               'recommended for faster directory parsing. Run:'
-		               '\n>>> pip install scandir')
+		for root, entries in _scan_dirs(path, cfg.recurse):
+			if filter_entries is not None:
+				entries = filter_entries(entries)
+			if executor is not None and len(entries) > 1:
+				list(executor.map(_prefetch_stat, entries))
+			yield root, entries
+	finally:
+		if executor is not None:
+			executor.shutdown()
 
 
 def scan_dir(path):
 	"""
-	Searches a root directory and returns a list of all files. If 
-	cfg.recurse is True, the scanner will descend all child directories.
+	Searches a root directory and yields all files as they are found.
+	If cfg.recurse is True, the scanner will descend all child
+	directories. Symlinks are skipped. Stats are taken from the
+	DirEntry, which has them cached from the directory listing on
+	Windows, and only costs a single stat call on other platforms. Set
+	cfg.stat_workers to stat files from a thread pool.
 
 	:param str path: The root path to scan for files.
-	:return: A list of filenames if cfg.get_stats is False, or a list
-			 of tuples (filename, file_stats) if cfg.get_stats is True.
+	:return: A generator of filenames if cfg.get_stats is False, or of
+			 tuples (filename, file_stats) if cfg.get_stats is True.
 	"""
-	file_list = []
-	if cfg.recurse:
-		for root, dirs, files in walk(path):
-			file_list += stat_files(root, files)
-	else:
-		file_list += stat_files(path, os.listdir(path))
-	return file_list
+	for root, entries in _scan_dir_entries(path):
+		for entry in entries:
+			if cfg.get_stats:
+				yield entry.path, entry.stat(follow_symlinks=False)
+			else:
+				yield entry.path
 
 
 def stat_files(root, files):
@@ -80,9 +150,14 @@ class Parser(object):
 		Parser.no_frame_numbers
 			Files that could not be parsed for frame numbers, thus could
 			not be sequenced.
+		Parser.excluded_paths
+			Filepaths with extensions that are either not in the include
+			list if one exists, or that are in the exclude list. They are
+			kept as strings, so they are never parsed.
 		Parser.excluded
-			Files with extensions that are either not in the include list
-			if one exists, or that are in the exclude list.
+			File objects for excluded_paths, built the first time this is
+			accessed after a parse. They don't have stats, even if the
+			parser was set to get them.
 		Parser.collisions
 			If ignore_padding is used when setting up the parser, it is
 			possible that two files attempt to insert into the same sequence,
@@ -91,6 +166,14 @@ class Parser(object):
 			is found that already exists in the matching sequence will get
 			added to collisions.
 
+	With soa=True, sequenced files are stored as rows in parallel
+	columns (paths, stat fields, frame numbers and paddings) while
+	parsing, and sequences are grouped as lists of row indices. File
+	objects are only built when a frame is read from a Sequence, which
+	greatly reduces memory use when parsing millions of files. The stats
+	of sequenced files are fetched while scanning so only their numbers
+	are kept, and their Files get a Stat instead of an os.stat_result.
+
 	>>> from ultrasequence import Parser
 	>>> include = ['tif', 'jpg', 'dpx', 'exr']
 	>>> parser = Parser(include_exts=include, ignore_padding=True)
@@ -102,7 +185,7 @@ class Parser(object):
 
 	def __init__(self, include_exts=cfg.include_exts,
 	             exclude_exts=cfg.exclude_exts, get_stats=cfg.get_stats,
-	             ignore_padding=cfg.ignore_padding):
+	             ignore_padding=cfg.ignore_padding, soa=False):
 		"""
 		Main parser class. Sets up config parameters for parsing methods.
 		
@@ -112,6 +195,8 @@ class Parser(object):
 		:param bool get_stats: get file stats from os.stats
 		:param bool ignore_padding: ignore the number of digits in the
 		                            file's frame number section
+		:param bool soa: store sequenced files as column rows and only
+		                 build File objects when they are accessed
 		"""
 		if not include_exts or not isinstance(include_exts, (tuple, list)):
 			self.include_exts = set()
@@ -125,6 +210,7 @@ class Parser(object):
 
 		cfg.get_stats = get_stats
 		self.ignore_padding = ignore_padding
+		self.soa = soa
 		self._reset()
 
 	def _reset(self):
@@ -133,23 +219,83 @@ class Parser(object):
 		self.sequences = []
 		self.orphan_frames = []
 		self.no_frame_numbers = []
-		self.excluded = []
+		self.excluded_paths = []
+		self._excluded = None
 		self.collisions = []
 		self.parsed = False
+		# soa mode columns, indexed by row
+		self._paths = []
+		# Stat fields of each row, filled for every row when the parse
+		# gets stats. See _append_row_stats for their order.
+		self._stat_ints = array('q')
+		self._stat_ids = array('Q')
+		self._stat_times = array('d')
+		# Row stats that could not be stored in the stat columns.
+		self._stat_fallback = {}
+		self._frames = array('q')
+		self._paddings = array('H')
+		self._seq_groups = {}
 
 	def __str__(self):
 		return ('Parser(sequences=%d, orphan_frames=%d, no_frame_numbers=%d, '
 				'excluded=%d, collisions=%d)' %
 				(len(self.sequences), len(self.orphan_frames),
-				 len(self.no_frame_numbers), len(self.excluded),
+				 len(self.no_frame_numbers),
+				 len(self.excluded_paths if self._excluded is None
+					 else self._excluded),
 				 len(self.collisions)))
 
 	def __repr__(self):
 		return ('<Parser object at %s, parsed=%s>' %
 				(hex(id(self)), self.parsed))
 
+	@property
+	def excluded(self):
+		""" List of File objects for the excluded_paths. """
+		if self._excluded is None:
+			self._excluded = [File(filepath)
+							  for filepath in self.excluded_paths]
+		return self._excluded
+
+	@excluded.setter
+	def excluded(self, files):
+		self._excluded = files
+
+	def _is_excluded(self, filepath):
+		"""
+		Checks the include and exclude extensions against the raw
+		filepath, so excluded files are never parsed. If the last dot of
+		the filepath is in a directory name, the partition contains a
+		path separator and can't match an extension, just like the
+		empty extension of such a file.
+		"""
+		if not self.include_exts and not self.exclude_exts:
+			return False
+		ext = filepath.rpartition('.')[2].lower()
+		return bool(self.include_exts and ext not in self.include_exts
+					or ext in self.exclude_exts)
+
+	def _filter_entries(self, entries):
+		"""
+		Drop the excluded DirEntry objects of a directory listing and add
+		their paths to excluded_paths.
+
+		:param list entries: DirEntry objects to filter.
+		:return: The list of entries that are not excluded.
+		"""
+		if not self.include_exts and not self.exclude_exts:
+			return entries
+		included = []
+		for entry in entries:
+			if self._is_excluded(entry.name):
+				self.excluded_paths.append(entry.path)
+			else:
+				included.append(entry)
+		return included
+
 	def _cleanup(self):
 		""" Moves single frames out of sequences list. """
+		self._build_row_sequences()
 		while self._sequences:
 			seq = self._sequences.popitem()[1]
 			if seq.frames == 1:
@@ -158,49 +304,185 @@ class Parser(object):
 				self.sequences.append(seq)
 		self.parsed = True
 
-	def _sort_file(self, filepath, stats=None):
-		""" Finds matching sequence for given filepath. """
-		file_ = File(filepath, stats=stats)
+	def _row_file_getter(self):
+		"""
+		Callable building the File object for a soa mode row. It holds on
+		to the current columns, so Sequences built from them keep their
+		files after _reset replaces the columns for a new parse.
+		"""
+		paths, fallback = self._paths, self._stat_fallback
+		ints, ids, times = self._stat_ints, self._stat_ids, self._stat_times
+
+		def get_file(row):
+			stats = fallback.get(row)
+			if stats is None and row * 3 < len(times):
+				size, nlink, mode, uid, gid = ints[row * 5:row * 5 + 5]
+				ino, dev = ids[row * 2:row * 2 + 2]
+				ctime, mtime, atime = times[row * 3:row * 3 + 3]
+				stats = (size, ino, ctime, mtime, atime, mode, dev, nlink, uid,
+						 gid)
+			return File(paths[row], stats=stats)
+		return get_file
 
-		if self.include_exts and file_.ext.lower() not in self.include_exts \
-				or file_.ext.lower() in self.exclude_exts:
-			self.excluded.append(file_)
+	def _append_row_stats(self, row, stats):
+		"""
+		Add the stat fields of a soa mode row to the stat columns. Stats
+		that are not an os.stat_result, or have values too large for the
+		columns, are kept as they are in the fallback dict instead.
 
-		elif file_.frame is None:
+		:param int row: Row index in the Parser columns.
+		:param stats: os.DirEntry, os.stat_result or other File stats.
+		"""
+		if callable(getattr(stats, 'stat', None)):  # os.DirEntry
+			try:
+				stats = stats.stat(follow_symlinks=False)
+			except OSError:
+				stats = Stat()
+		if isinstance(stats, os.stat_result):
+			try:
+				ints = array('q', (stats.st_size, stats.st_nlink,
+								   stats.st_mode, stats.st_uid, stats.st_gid))
+				ids = array('Q', (stats.st_ino, stats.st_dev))
+			except OverflowError:
+				pass
+			else:
+				self._stat_ints.extend(ints)
+				self._stat_ids.extend(ids)
+				self._stat_times.extend((stats.st_ctime, stats.st_mtime,
+										 stats.st_atime))
+				return
+		self._stat_fallback[row] = stats
+		self._stat_ints.extend((0, 0, 0, 0, 0))
+		self._stat_ids.extend((0, 0))
+		self._stat_times.extend((0.0, 0.0, 0.0))
+
+	def _build_row_sequences(self):
+		""" Turn the soa mode row groups into Sequences. """
+		get_file = self._row_file_getter()
+		while self._seq_groups:
+			seq_name, rows = self._seq_groups.popitem()
+			seq = Sequence(get_file(rows[0]))
+			for row in rows[1:]:
+				frame = self._frames[row]
+				if frame < 0:  # did not fit the frames column
+					frame = get_file(row).frame
+				try:
+					seq._append_row(frame, self._paddings[row], row, get_file)
+				except IndexError:
+					self.collisions.append(get_file(row))
+			self._sequences[seq_name] = seq
+
+	def _sort_row(self, filepath, stats=None, parts=None):
+		"""
+		Finds matching row group for given filepath in soa mode.
+
+		:param str filepath: The filepath to sort.
+		:param stats: The file stats, if any.
+		:param tuple parts: The _parse_path parts of filepath if they
+		                    were already parsed.
+		"""
+		if parts is None:
+			parts = _parse_path(filepath)
+		framenum, head, tail = parts[5], parts[6], parts[7]
+
+		if not framenum:
+			self.no_frame_numbers.append(File(filepath, stats=stats))
+
+		else:
+			row = len(self._paths)
+			self._paths.append(filepath)
+			if stats is not None:
+				self._append_row_stats(row, stats)
+			try:
+				self._frames.append(int(framenum))
+			except OverflowError:
+				self._frames.append(-1)
+			self._paddings.append(len(framenum))
+			seq_name = _seq_key(head, framenum, tail, cfg.ignore_padding)
+			rows = self._seq_groups.get(seq_name)
+			if rows is None:
+				self._seq_groups[seq_name] = [row]
+			else:
+				rows.append(row)
+
+	def _sort_file(self, filepath, stats=None, parts=None):
+		"""
+		Finds matching sequence for given filepath, unless its extension
+		is excluded.
+
+		:param str filepath: The filepath to sort.
+		:param stats: The file stats, if any.
+		:param tuple parts: The _parse_path parts of filepath if they
+		                    were already parsed.
+		"""
+		if self._is_excluded(filepath):
+			self.excluded_paths.append(filepath)
+		else:
+			self._sort_included(filepath, stats, parts)
+
+	def _sort_included(self, filepath, stats=None, parts=None):
+		"""
+		Finds matching sequence for a filepath that was already checked
+		against the include and exclude extensions.
+
+		:param str filepath: The filepath to sort.
+		:param stats: The file stats, if any.
+		:param tuple parts: The _parse_path parts of filepath if they
+		                    were already parsed.
+		"""
+		if self.soa:
+			return self._sort_row(filepath, stats, parts)
+		file_ = File(filepath, stats=stats, parts=parts)
+
+		if file_.frame is None:
 			self.no_frame_numbers.append(file_)
 
 		else:
 			seq_name = file_.get_seq_key()
-			if seq_name in self._sequences:
+			seq = self._sequences.get(seq_name)
+			if seq is None:
+				self._sequences[seq_name] = Sequence(file_)
+			else:
 				try:
-					self._sequences[seq_name].append(file_)
+					seq._append_fast(file_)
 				except IndexError:
 					self.collisions.append(file_)
-			else:
-				self._sequences[seq_name] = Sequence(file_)
 
-	def parse_directory(self, directory, recurse=cfg.recurse):
+	def parse_directory(self, directory, recurse=cfg.recurse,
+						stat_workers=cfg.stat_workers):
 		"""
 		Parse a directory on the file system.
 
 		:param str directory: Directory path to scan on filesystem.
 		:param bool recurse: Recurse all child directories.
+		:param int stat_workers: Number of threads to get file stats
+		                         with, 0 or 1 to get them serially.
 		"""
 		self._reset()
 		cfg.recurse = recurse
+		cfg.stat_workers = stat_workers
 		directory = os.path.expanduser(directory)
 		if isinstance(directory, str) and os.path.isdir(directory):
-			file_list = scan_dir(directory)
-			while file_list:  # reduce memory consumption for large lists
-				file_ = file_list.pop(0)
-				if cfg.get_stats:
-					self._sort_file(file_[0], file_[1])
-				else:
-					self._sort_file(file_)
+			self._sort_directory(directory)
 			self._cleanup()
 		else:
 			logger.warning('%s is not an available directory.' % directory)
 
+	def _sort_directory(self, directory):
+		"""
+		Scan a directory, parsing the filenames of each directory in one
+		batch.
+		"""
+		for root, entries in _scan_dir_entries(directory,
+											   self._filter_entries):
+			if not entries:
+				continue
+			root = os.path.dirname(entries[0].path)
+			names = [entry.name for entry in entries]
+			for entry, parts in zip(entries, _parse_names(root, names)):
+				self._sort_included(entry.path,
+									entry if cfg.get_stats else None, parts)
+
 	def parse_file(self, input_file):
 		"""
 		Parse a text file containing file listings.
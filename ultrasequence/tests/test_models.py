@@ -1,4 +1,5 @@
 import os
+import pickle
 import unittest
 from unittest import TestCase
 from ultrasequence import models
@@ -33,6 +34,12 @@ class TestExtractFrame(TestCase):
 		result = models.extract_frame('/path/to/vid_v1_2018.10.exr')
 		self.assertTupleEqual(result, ('/path/to/vid_v1_2018.', '10', '.exr'))
 
+	def test_custom_regex(self):
+		CONFIG.frame_extract_re = r'(\D*)(\d+)(.*)'
+		CONFIG.head_group, CONFIG.frame_group, CONFIG.tail_group = 0, 1, 2
+		result = models.extract_frame('vid_v1_2018.10.exr')
+		self.assertTupleEqual(result, ('vid_v', '1', '_2018.10.exr'))
+
 
 class TestSplitExtension(TestCase):
 	def setUp(self):
@@ -50,6 +57,43 @@ class TestSplitExtension(TestCase):
 		split = models.split_extension('testext1')
 		self.assertTupleEqual(split, ('testext1', ''))
 
+	def test_split_trailing_dot(self):
+		split = models.split_extension('test.')
+		self.assertTupleEqual(split, ('test', ''))
+
+
+class TestParseNames(TestCase):
+	def setUp(self):
+		CONFIG.reset_defaults()
+
+	def test_parse_names_matches_parse_path(self):
+		names = ['file.0100.ext', 'file_0100_name.ext', '1000', 'no_digits']
+		for path in ('/path/to', '/', ''):
+			expected = [models._parse_path(os.path.join(path, name))
+						for name in names]
+			self.assertListEqual(models._parse_names(path, names), expected)
+
+	def test_parse_names_custom_frame_extract(self):
+		CONFIG.frame_extract_re = r'(.*?)(\d{2})(.*)'
+		CONFIG.head_group, CONFIG.frame_group, CONFIG.tail_group = 0, 1, 2
+		result = models._parse_names('/path', ['a_0100_b.ext', 'no_digits'])
+		self.assertEqual(result[0][4:], ('a_', '01', '/path/a_', '00_b.ext'))
+		self.assertEqual(result[1][4:], ('no_digits', '', '/path/no_digits',
+										 ''))
+
+	@unittest.skipIf(models._fast_parse_name is None,
+					 'compiled speedups not built')
+	def test_fast_parse_name_matches_python(self):
+		fast_parse_name = models._fast_parse_name
+		names = ['file.0100.ext', 'file_0100_name.ext', '1000', 'no_digits',
+				 'file.', '.hidden', 'a1b2.c3']
+		self.addCleanup(setattr, models, '_fast_parse_name', fast_parse_name)
+		fast = [fast_parse_name('/path', '/path/', name) for name in names]
+		models._fast_parse_name = None
+		self.assertListEqual(
+			fast, [models._parse_name('/path', '/path/', name, True)
+				   for name in names])
+
 
 class TestFrameRangesToString(TestCase):
 	def setUp(self):
@@ -73,6 +117,26 @@ class TestFrameRangesToString(TestCase):
 		result = models.frame_ranges_to_string([5])
 		self.assertEqual(result, '[5]')
 
+	def test_convert_large_list(self):
+		frames = list(range(1, 101)) + [150] + list(range(200, 301))
+		result = models.frame_ranges_to_string(frames)
+		self.assertEqual(result, '[1-100, 150, 200-300]')
+
+	def test_convert_does_not_modify_input(self):
+		frames = [3, 1, 2]
+		models.frame_ranges_to_string(frames)
+		self.assertListEqual(frames, [3, 1, 2])
+
+	def test_convert_very_large_list(self):
+		frames = list(range(5000)) + list(range(5002, 10000))
+		result = models.frame_ranges_to_string(frames)
+		self.assertEqual(result, '[0-4999, 5002-9999]')
+
+	def test_convert_large_unsorted_list(self):
+		frames = list(range(300, 199, -1)) + [150] + list(range(1, 101))
+		result = models.frame_ranges_to_string(frames)
+		self.assertEqual(result, '[1-100, 150, 200-300]')
+
 
 class TestStat(TestCase):
 	def setUp(self):
@@ -118,6 +182,29 @@ class TestStat(TestCase):
 		self.assertIsInstance(self.stat.st_gid, int)
 		self.assertEqual(self.stat.st_gid, 10)
 
+	def test_convert_values(self):
+		stat = models.Stat(size='1', mtime=4)
+		self.assertEqual(stat.st_size, 1)
+		self.assertIsInstance(stat.st_mtime, float)
+
+	def test_missing_values(self):
+		stat = models.Stat()
+		self.assertIsNone(stat.st_size)
+		self.assertIsNone(stat.st_mtime)
+
+	def test_pickle(self):
+		for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+			stat = pickle.loads(pickle.dumps(self.stat, protocol))
+			self.assertEqual(stat.st_size, 1)
+			self.assertEqual(stat.st_atime, 5.1)
+
+	def test_unconvertible_values(self):
+		stat = models.Stat(size='', ino=[], mtime='n/a', atime='5.1')
+		self.assertIsNone(stat.st_size)
+		self.assertIsNone(stat.st_ino)
+		self.assertIsNone(stat.st_mtime)
+		self.assertEqual(stat.st_atime, 5.1)
+
 
 class TestFile(TestCase):
 	def setUp(self):
@@ -177,6 +264,12 @@ class TestFile(TestCase):
 		self.assertEqual(_file.tail, '.ext')
 		self.assertEqual(_file.padding, 4)
 
+	def test_shared_strings_interned(self):
+		self.assertIs(self.file_10.head, self.file_11.head)
+		self.assertIs(self.file_10.tail, self.file_11.tail)
+		self.assertIs(self.file_10.get_seq_key(True),
+					  self.file_11.get_seq_key(True))
+
 	def test_use_stat_dict(self):
 		stats = {
 			'size': 1,
@@ -221,6 +314,29 @@ class TestFile(TestCase):
 		_file = models.File(__file__, os.stat(__file__))
 		self.assertIsInstance(_file.stat, os.stat_result)
 
+	def test_dir_entry_lazy_stat(self):
+		class Entry(object):
+			calls = 0
+
+			def stat(self, follow_symlinks=True):
+				self.calls += 1
+				return os.stat(__file__)
+
+		entry = Entry()
+		_file = models.File(__file__, stats=entry)
+		self.assertEqual(entry.calls, 0)
+		self.assertIsInstance(_file.stat, os.stat_result)
+		self.assertEqual(_file.size, os.stat(__file__).st_size)
+		self.assertEqual(entry.calls, 1)
+
+	def test_dir_entry_stat_error(self):
+		class Entry(object):
+			def stat(self, follow_symlinks=True):
+				raise OSError
+
+		_file = models.File('/not/a/file/path.none', stats=Entry())
+		self.assertIsInstance(_file.stat, models.Stat)
+
 	def test_get_stat(self):
 		_file = models.File(__file__, get_stats=True)
 		self.assertIsInstance(_file.stat, os.stat_result)
@@ -233,6 +349,23 @@ class TestFile(TestCase):
 		self.assertEqual(_file.size, 15)
 		self.assertIsNone(_file.inode)
 
+	def test_precomputed_parts(self):
+		path = '/path/to/file_0100_name.ext'
+		_file = models.File(path, parts=models._parse_names(
+			'/path/to', ['file_0100_name.ext'])[0])
+		expected = models.File(path)
+		for attr in models.File.__slots__:
+			if attr == '_stat':
+				continue
+			self.assertEqual(getattr(_file, attr), getattr(expected, attr))
+
+	def test_unconvertible_stats(self):
+		_file = models.File('/x/a.0001.exr', stats={'size': '', 'mtime': 'n/a',
+													 'uid': '7'})
+		self.assertIsNone(_file.stat.st_size)
+		self.assertIsNone(_file.stat.st_mtime)
+		self.assertEqual(_file.uid, 7)
+
 	def test_get_stats_override_supplied_stats(self):
 		stats = {'size': -15, 'ino': None}
 		_file = models.File(__file__, stats=stats, get_stats=True)
@@ -364,6 +497,28 @@ class TestSequence(TestCase):
 		with self.assertRaises(IndexError):
 			seq.append('/path/to/file.0100.ext')
 
+	def test_sequence_append_out_of_order(self):
+		seq = models.Sequence('/path/to/file.0105.ext')
+		for frame in (103, 108, 101):
+			seq.append('/path/to/file.%04d.ext' % frame)
+		self.assertEqual(seq.start, 101)
+		self.assertEqual(seq.end, 108)
+		seq.append('/path/to/file.0102.ext')
+		self.assertListEqual(seq.frame_numbers, [101, 102, 103, 105, 108])
+		self.assertEqual(seq[1].frame, 102)
+		self.assertEqual(seq.format('%R'), '[101-103, 105, 108]')
+
+	def test_sequence_append_fast(self):
+		seq = models.Sequence('/path/to/file.0100.ext')
+		seq._append_fast(models.File('/path/to/file.0098.ext'))
+		seq._append_fast(models.File('/path/to/file.01099.ext'))
+		self.assertListEqual(seq.frame_numbers, [98, 100, 1099])
+		self.assertEqual(seq.padding, 5)
+		self.assertTrue(seq.inconsistent_padding)
+		with self.assertRaises(IndexError):
+			seq._append_fast(models.File('/path/to/file.0100.ext'))
+		self.assertEqual(seq.frames, 3)
+
 	def test_sequence_append_non_member(self):
 		_file = models.File('/path/to/file.0100.ext')
 		seq = models.Sequence(_file)
@@ -396,6 +551,16 @@ class TestSequence(TestCase):
 			sequence.append(_file)
 		self.assertEqual(sequence.size, 30)
 
+	def test_sequence_unordered_append(self):
+		seq = models.Sequence()
+		for frame in (5, 2, 9, 3):
+			seq.append('/path/to/file.%04d.ext' % frame)
+		self.assertEqual(seq.start, 2)
+		self.assertEqual(seq.end, 9)
+		self.assertListEqual(seq.frame_numbers, [2, 3, 5, 9])
+		self.assertEqual(seq[1].frame, 3)
+		self.assertListEqual([f.frame for f in seq[1:3]], [3, 5])
+
 	def test_get_missing_frames(self):
 		files = [
 			'/abs/path/to/file_0100_name.ext',
@@ -469,6 +634,12 @@ class TestSequenceFormatting(TestCase):
 		self.assertEqual(self.seq.format('test%Mtest%M'),
 						 'test[103, 105-106, 109]test[103, 105-106, 109]')
 
+	def test_format_no_missing_frames(self):
+		seq = models.Sequence()
+		for frame in range(1, 5):
+			seq.append('/abs/path/to/file_%04d_name.ext' % frame)
+		self.assertEqual(seq.format('%M'), '[]')
+
 	def test_format_pound_padding(self):
 		self.assertEqual(self.seq.format('%D'), '####')
 		self.assertEqual(self.seq.format('test%Dtest%D'),
@@ -499,10 +670,30 @@ class TestSequenceFormatting(TestCase):
 		self.assertEqual(self.seq.format('100%% Success'),
 						 '100% Success')
 
+	def test_format_escaped_directive(self):
+		self.assertEqual(self.seq.format('%%p%p'), '%p/abs/path/to')
+
+	def test_format_trailing_pct(self):
+		self.assertEqual(self.seq.format('%e%'), 'ext')
+
 	def test_format_invalid_directive(self):
 		with self.assertRaises(KeyError):
 			self.seq.format('Try%^Fail')
 
+	def test_format_compiled_once(self):
+		self.seq.format('%h%r%T')
+		program = models.Sequence._compile_format('%h%r%T')
+		self.assertIs(models.Sequence._compile_format('%h%r%T'), program)
+
+	def test_str_updates_on_append(self):
+		self.assertEqual(str(self.seq),
+						 '/abs/path/to/file_[0100-0110]_name.ext')
+		self.seq.append('/abs/path/to/file_0111_name.ext')
+		self.assertEqual(str(self.seq),
+						 '/abs/path/to/file_[0100-0111]_name.ext')
+		CONFIG.format = '%h%r'
+		self.assertEqual(str(self.seq), 'file_[0100-0111]')
+
 
 if __name__ == '__main__':
 	unittest.main()
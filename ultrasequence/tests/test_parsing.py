@@ -1,11 +1,13 @@
 import unittest
+import copy
 import os
+import pickle
+import shutil
+import sys
+import tempfile
 from unittest import TestCase
-try:
-	from unittest.mock import patch
-except ImportError:
-	from mock import patch
-from ultrasequence import parsing
+from unittest.mock import patch
+from ultrasequence import models, parsing
 from ultrasequence.config import CONFIG
 
 
@@ -40,27 +42,112 @@ class TestScanDir(TestCase):
 			)
 		]
 
-	@patch('os.listdir')
-	def test_scan_dir_default_no_recurse(self, mock_listdir):
-		mock_listdir.return_value = self.walk[0][2]
-		with patch('ultrasequence.parsing.stat_files') as mock_stat_files:
-			mock_stat_files.side_effect = stat_mock
-			result = parsing.scan_dir('/root')
-			expected = [os.path.join('/root', file)
-						for file in self.walk[0][2]]
-			self.assertListEqual(result, expected)
-
-	@patch('ultrasequence.parsing.walk')
-	def test_scan_dir_recurse(self, mock_walk):
+	def _make_tree(self):
+		tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, tmp)
+		for root, dirs, files in self.walk:
+			root = tmp + root
+			if not os.path.isdir(root):
+				os.makedirs(root)
+			for file_ in files:
+				open(os.path.join(root, file_), 'w').close()
+		return tmp
+
+	def test_scan_dir_default_no_recurse(self):
+		tmp = self._make_tree()
+		result = list(parsing.scan_dir(os.path.join(tmp, 'root')))
+		expected = [os.path.join(tmp, 'root', file)
+					for file in self.walk[0][2]]
+		self.assertListEqual(sorted(result), expected)
+
+	def test_scan_dir_recurse(self):
+		CONFIG.recurse = True
+		tmp = self._make_tree()
+		result = list(parsing.scan_dir(os.path.join(tmp, 'root')))
+		expected = []
+		for root, dirs, files in self.walk:
+			expected += [tmp + os.path.join(root, file) for file in files]
+		self.assertListEqual(sorted(result), sorted(expected))
+
+	def test_scan_dir_enable_stats(self):
+		CONFIG.get_stats = True
+		tmp = self._make_tree()
+		result = list(parsing.scan_dir(os.path.join(tmp, 'root')))
+		self.assertEqual(len(result), 2)
+		for path, stats in result:
+			self.assertEqual(stats.st_size, 0)
+
+	def test_scan_dir_stat_workers(self):
+		CONFIG.get_stats = True
 		CONFIG.recurse = True
-		mock_walk.return_value = self.walk
-		with patch('ultrasequence.parsing.stat_files') as mock_stat_files:
-			mock_stat_files.side_effect = stat_mock
-			result = parsing.scan_dir('/root')
-			expected = []
-			for root, dirs, files in self.walk:
-				expected += [os.path.join(root, file) for file in files]
-			self.assertListEqual(result, expected)
+		tmp = self._make_tree()
+		serial = sorted(parsing.scan_dir(os.path.join(tmp, 'root')))
+		CONFIG.stat_workers = 4
+		threaded = sorted(parsing.scan_dir(os.path.join(tmp, 'root')))
+		self.assertEqual(len(threaded), 6)
+		self.assertListEqual([path for path, stats in threaded],
+							 [path for path, stats in serial])
+		for path, stats in threaded:
+			self.assertEqual(stats.st_ino, os.stat(path).st_ino)
+
+	@unittest.skipUnless(hasattr(os, 'symlink'), 'requires os.symlink')
+	def test_scan_dir_skip_symlinks(self):
+		tmp = self._make_tree()
+		root = os.path.join(tmp, 'root')
+		os.symlink(os.path.join(root, 'file_a.ext'),
+				   os.path.join(root, 'file_c.ext'))
+		result = list(parsing.scan_dir(root))
+		self.assertNotIn(os.path.join(root, 'file_c.ext'), result)
+		self.assertEqual(len(result), 2)
+
+	def test_scan_dir_skip_unlistable_dir(self):
+		CONFIG.recurse = True
+		tmp = self._make_tree()
+		locked = os.path.join(tmp, 'root', 'seq_one')
+		scandir = parsing.scandir
+
+		def locked_scandir(path):
+			if path == locked:
+				raise PermissionError(13, 'Permission denied', path)
+			return scandir(path)
+
+		with patch('ultrasequence.parsing.scandir', locked_scandir):
+			with self.assertLogs('ultrasequence.parsing', 'WARNING') as logs:
+				result = list(parsing.scan_dir(os.path.join(tmp, 'root')))
+				parser = parsing.Parser(soa=True)
+				parser.parse_directory(os.path.join(tmp, 'root'),
+									   recurse=True)
+		self.assertEqual(len(logs.output), 2)
+		self.assertEqual(len(result), 3)
+		self.assertFalse(any(path.startswith(locked) for path in result))
+		self.assertEqual(len(parser.no_frame_numbers), 3)
+
+	def test_scan_dirs_deeper_than_recursion_limit(self):
+		tmp = tempfile.mkdtemp()
+		self.addCleanup(os.rmdir, tmp)
+		# Lower the limit so the tree stays within PATH_MAX and MAX_PATH.
+		recursion_limit = sys.getrecursionlimit()
+		sys.setrecursionlimit(100)
+		self.addCleanup(sys.setrecursionlimit, recursion_limit)
+		dirs = [os.path.join(tmp, 'side'), os.path.join(tmp, 'side', 'x')]
+		deep = tmp
+		for _ in range(sys.getrecursionlimit() + 50):
+			deep = os.path.join(deep, 'd')
+			dirs.append(deep)
+		# shutil.rmtree recurses, so remove the tree deepest first
+		for dir_ in dirs:
+			os.mkdir(dir_)
+			self.addCleanup(os.rmdir, dir_)
+		deep_file = os.path.join(deep, 'file.0001.ext')
+		open(deep_file, 'w').close()
+		self.addCleanup(os.remove, deep_file)
+
+		roots = [root for root, entries in parsing._scan_dirs(tmp, True)]
+		self.assertEqual(len(roots), len(dirs) + 1)
+		depths = [root.count(os.sep) for root in roots]
+		self.assertListEqual(depths, sorted(depths))
+		CONFIG.recurse = True
+		self.assertListEqual(list(parsing.scan_dir(tmp)), [deep_file])
 
 	@patch('os.path.isfile', return_value=True)
 	def test_stat_files_default_no_stats(self, mock_isfile):
@@ -78,5 +165,201 @@ class TestScanDir(TestCase):
 		self.assertListEqual(result, expected)
 
 
+class TestParser(TestCase):
+	def setUp(self):
+		CONFIG.reset_defaults()
+		self.tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.tmp)
+		files = ['file.0001.ext', 'file.0002.ext', 'file.0004.ext',
+				 'single.0001.ext', 'no_frame.ext', 'excluded.0001.mov']
+		for file_ in files:
+			with open(os.path.join(self.tmp, file_), 'w') as f:
+				f.write('data')
+
+	def test_parse_directory(self):
+		parser = parsing.Parser(exclude_exts=['mov'])
+		parser.parse_directory(self.tmp)
+		self.assertTrue(parser.parsed)
+		self.assertEqual(len(parser.sequences), 1)
+		self.assertEqual(parser.sequences[0].format('%h%r%T'),
+						 'file.[0001-0004].ext')
+		self.assertEqual(len(parser.orphan_frames), 1)
+		self.assertEqual(len(parser.no_frame_numbers), 1)
+		self.assertEqual(len(parser.excluded), 1)
+
+	def test_parse_directory_include_exts(self):
+		for soa in (False, True):
+			parser = parsing.Parser(include_exts=['ext'], soa=soa)
+			parser.parse_directory(self.tmp)
+			self.assertListEqual(parser.excluded_paths, [
+				os.path.join(self.tmp, 'excluded.0001.mov')])
+			self.assertIsInstance(parser.excluded[0], models.File)
+			self.assertEqual(len(parser.sequences), 1)
+
+	def test_excluded_not_stat_prefetched(self):
+		prefetched = []
+
+		def prefetch_stat(entry):
+			prefetched.append(entry.name)
+			entry.stat(follow_symlinks=False)
+
+		for soa in (False, True):
+			del prefetched[:]
+			parser = parsing.Parser(exclude_exts=['mov'], get_stats=True,
+									soa=soa)
+			with patch('ultrasequence.parsing._prefetch_stat',
+					   prefetch_stat):
+				parser.parse_directory(self.tmp, stat_workers=2)
+			self.assertEqual(len(prefetched), 5)
+			self.assertNotIn('excluded.0001.mov', prefetched)
+			self.assertEqual(len(parser.excluded_paths), 1)
+
+	def test_excluded_checked_once(self):
+		for soa in (False, True):
+			parser = parsing.Parser(exclude_exts=['mov'], soa=soa)
+			with patch.object(parser, '_is_excluded',
+							  wraps=parser._is_excluded) as is_excluded:
+				parser.parse_directory(self.tmp)
+			self.assertEqual(is_excluded.call_count, 6)
+			self.assertEqual(len(parser.excluded_paths), 1)
+
+	def test_excluded_cached(self):
+		parser = parsing.Parser(exclude_exts=['mov'])
+		parser.parse_directory(self.tmp)
+		self.assertIs(parser.excluded, parser.excluded)
+		parser.excluded.clear()
+		self.assertListEqual(parser.excluded, [])
+		self.assertIn('excluded=0', str(parser))
+		parser.parse_directory(self.tmp)
+		self.assertEqual(len(parser.excluded), 1)
+
+	def test_excluded_dotted_directory(self):
+		parser = parsing.Parser(include_exts=['dpx'])
+		parser._sort_file('/path/v1.dpx/file.0001')
+		parser._sort_file('/path/v1.dpx/file.0001.dpx')
+		self.assertListEqual(parser.excluded_paths,
+							 ['/path/v1.dpx/file.0001'])
+
+	def test_parse_directory_get_stats(self):
+		parser = parsing.Parser(get_stats=True)
+		parser.parse_directory(self.tmp)
+		self.assertEqual(parser.sequences[0].size, 12)
+		self.assertIsInstance(parser.sequences[0][0].stat, os.stat_result)
+
+	def test_parse_file(self):
+		data = os.path.join(os.path.dirname(__file__), 'data',
+							'test_sequencer_regular.txt')
+		parser = parsing.Parser()
+		parser.parse_file(data)
+		self.assertEqual(len(parser.sequences), 16)
+		self.assertEqual(len(parser.orphan_frames), 2)
+		self.assertEqual(len(parser.no_frame_numbers), 2)
+
+	def test_parse_file_soa(self):
+		data = os.path.join(os.path.dirname(__file__), 'data',
+							'test_sequencer_regular.txt')
+		parser = parsing.Parser()
+		parser.parse_file(data)
+		soa_parser = parsing.Parser(soa=True)
+		soa_parser.parse_file(data)
+		for attr in ('sequences', 'orphan_frames', 'no_frame_numbers',
+					 'excluded', 'collisions'):
+			self.assertListEqual(
+				sorted(str(x) for x in getattr(soa_parser, attr)),
+				sorted(str(x) for x in getattr(parser, attr)))
+
+	def test_parse_directory_soa_lazy_files(self):
+		parser = parsing.Parser(exclude_exts=['mov'], get_stats=True,
+								soa=True)
+		parser.parse_directory(self.tmp)
+		seq = parser.sequences[0]
+		self.assertNotIsInstance(dict.get(seq._frames, 4), models.File)
+		self.assertIsInstance(seq.get_frame(4), models.File)
+		self.assertIsInstance(dict.get(seq._frames, 4), models.File)
+		self.assertEqual(seq.size, 12)
+		self.assertEqual(len(parser.orphan_frames), 1)
+		path = os.path.join(self.tmp, 'file.0002.ext')
+		self.assertEqual(seq.get_frame(2).stat.st_ino, os.stat(path).st_ino)
+		self.assertEqual(seq.get_frame(2).mtime, os.stat(path).st_mtime)
+
+	def test_parse_directory_soa_recurse(self):
+		sub_dir = os.path.join(self.tmp, 'sub')
+		os.mkdir(sub_dir)
+		for file_ in ('file.0001.ext', 'file.0002.ext', 'other_1.ext'):
+			open(os.path.join(sub_dir, file_), 'w').close()
+		parser = parsing.Parser()
+		parser.parse_directory(self.tmp + os.sep, recurse=True)
+		soa_parser = parsing.Parser(soa=True)
+		soa_parser.parse_directory(self.tmp + os.sep, recurse=True)
+		for attr in ('sequences', 'orphan_frames', 'no_frame_numbers'):
+			self.assertListEqual(
+				sorted(str(x) for x in getattr(soa_parser, attr)),
+				sorted(str(x) for x in getattr(parser, attr)))
+		self.assertEqual(len(soa_parser.sequences), 2)
+
+	def test_parse_directory_soa_reuse_parser(self):
+		other_dir = os.path.join(self.tmp, 'other')
+		os.mkdir(other_dir)
+		for file_ in ('zz.0005.dpx', 'zz.0006.dpx'):
+			open(os.path.join(other_dir, file_), 'w').close()
+		parser = parsing.Parser(exclude_exts=['mov'], soa=True)
+		parser.parse_directory(self.tmp)
+		seqs = parser.sequences
+		parser.parse_directory(other_dir)
+		self.assertListEqual(
+			sorted(str(f) for f in seqs[0]),
+			[os.path.join(self.tmp, 'file.%04d.ext' % frame)
+			 for frame in (1, 2, 4)])
+		self.assertListEqual(
+			sorted(str(f) for f in parser.sequences[0]),
+			[os.path.join(other_dir, 'zz.%04d.dpx' % frame)
+			 for frame in (5, 6)])
+
+	def test_parse_directory_pickle(self):
+		parser = parsing.Parser(exclude_exts=['mov'], get_stats=True)
+		parser.parse_directory(self.tmp)
+		for seqs in (pickle.loads(pickle.dumps(parser.sequences)),
+					 pickle.loads(pickle.dumps(parser.sequences, 0)),
+					 copy.deepcopy(parser.sequences)):
+			self.assertEqual(str(seqs[0]), str(parser.sequences[0]))
+			self.assertIsNone(seqs[0][0]._entry)
+			self.assertEqual(seqs[0][0].stat.st_ino,
+							 parser.sequences[0][0].stat.st_ino)
+			self.assertEqual(seqs[0].size, 12)
+
+	def test_parse_directory_soa_pickle(self):
+		parser = parsing.Parser(exclude_exts=['mov'], get_stats=True,
+								soa=True)
+		parser.parse_directory(self.tmp)
+		for seqs in (pickle.loads(pickle.dumps(parser.sequences)),
+					 copy.deepcopy(parser.sequences)):
+			self.assertIs(type(seqs[0]._frames), dict)
+			self.assertEqual(str(seqs[0]), str(parser.sequences[0]))
+			self.assertListEqual([str(f) for f in seqs[0]],
+								 [str(f) for f in parser.sequences[0]])
+			self.assertEqual(seqs[0].size, 12)
+
+	def test_soa_stat_fallback(self):
+		parser = parsing.Parser(soa=True)
+		parser._sort_file('a.1.ext', os.stat(__file__))
+		parser._sort_file('a.2.ext', {'size': 5, 'ino': 2 ** 70})
+		parser._cleanup()
+		seq = parser.sequences[0]
+		self.assertEqual(seq.get_frame(1).size, os.stat(__file__).st_size)
+		self.assertEqual(seq.get_frame(2).size, 5)
+		self.assertEqual(seq.get_frame(2).inode, 2 ** 70)
+
+	def test_soa_collisions(self):
+		parser = parsing.Parser(soa=True)
+		for file_ in ('a.1.ext', 'a.2.ext', 'a.01.ext', 'b.1.ext', 'b.01.ext'):
+			parser._sort_file(file_)
+		parser._cleanup()
+		self.assertListEqual(sorted(str(f) for f in parser.collisions),
+							 ['a.01.ext', 'b.01.ext'])
+		self.assertListEqual([str(f) for f in parser.orphan_frames],
+							 ['b.1.ext'])
+		self.assertFalse(parser.sequences[0].inconsistent_padding)
+
+
 if __name__ == '__main__':
 	unittest.main()